@@ -0,0 +1,43 @@
+"""Build the simplified /info response from a yt-dlp info dict.
+
+Fully annotated so it can be compiled with mypyc (`mypyc _simplify.py`);
+the compiled extension takes precedence over this file on import.
+"""
+from typing import Any
+
+
+def simplify_info(info: dict[str, Any], usable_formats: list[dict[str, Any]],
+                  has_po_token: bool) -> dict[str, Any]:
+    formats: list[dict[str, Any]] = []
+    for fmt in usable_formats:
+        formats.append({
+            'format_id': fmt.get('format_id'),
+            'ext': fmt.get('ext'),
+            'resolution': fmt.get('resolution'),
+            'filesize': fmt.get('filesize'),
+            'protocol': fmt.get('protocol'),
+            'vcodec': fmt.get('vcodec'),
+            'acodec': fmt.get('acodec')
+        })
+
+    warnings: list[str] = []
+    # Add warnings if we had to use workarounds
+    if len(usable_formats) < len(info.get('formats') or ()):
+        warnings.append('Some formats unavailable due to YouTube restrictions')
+        if has_po_token:
+            warnings.append('Consider updating your PO Token for more formats')
+        else:
+            warnings.append('Consider providing a PO Token for more formats')
+
+    return {
+        'status': 'success',
+        'video_id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'thumbnail': info.get('thumbnail'),
+        'uploader': info.get('uploader'),
+        'view_count': info.get('view_count'),
+        'availability': info.get('availability'),
+        'formats': formats,
+        'warnings': warnings
+    }
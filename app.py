@@ -1,11 +1,50 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, url_for
+from flask.json.provider import JSONProvider
+import orjson
+import msgpack
 import yt_dlp
 import os
 import logging
 from datetime import datetime
-import random
+import itertools
+import mimetypes
+import gzip
+import uuid
+import subprocess
+import fcntl
+import re
+import shutil
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import socket
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock, RLock
+from urllib.parse import urlsplit, urlunsplit, parse_qs, quote
+from cachetools import TTLCache
+from _simplify import simplify_info
+from meta_cache import MetaCache
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+            mimetype='application/json'
+        )
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Enhanced logging configuration
 logging.basicConfig(
@@ -18,9 +57,60 @@ logging.basicConfig(
 )
 logger = logging.getLogger('YT-API')
 
+# Prefer a pooled HTTP/2 client over yt-dlp's per-request urllib connections
+try:
+    import httpx_handler  # noqa: F401 (registers the handler with yt-dlp)
+except ImportError:
+    logger.warning("httpx not installed, falling back to yt-dlp's urllib handler")
+else:
+    # httpx logs every request URL at INFO, including signed googlevideo URLs
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger('httpcore').setLevel(logging.WARNING)
+
 # Configuration
 DOWNLOAD_FOLDER = 'downloads'
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+# When set (e.g. '/protected/'), finished downloads are handed to nginx via
+# X-Accel-Redirect instead of being streamed by the app
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+ALLOWED_EXTENSIONS = frozenset(('.mp4', '.webm', '.mkv', '.mp3', '.m4a'))
+
+# In-process cache of pre-serialized /info responses (JSON bytes, a gzipped
+# copy and a MessagePack encoding), keyed by video id
+INFO_CACHE = TTLCache(maxsize=4096, ttl=600)
+INFO_CACHE_LOCK = RLock()
+
+# Persistent second-level cache so restarts stay warm
+META_CACHE = MetaCache(
+    os.environ.get('META_CACHE_PATH', 'meta.db'),
+    ttl=int(os.environ.get('META_CACHE_TTL', 6 * 3600)),
+    maxsize=3000
+)
+atexit.register(META_CACHE.close)
+
+MAX_BATCH_URLS = 64
+
+# Read/write downloads in fixed 1 MiB blocks instead of yt-dlp's adaptive
+# buffer, which starts at 1 KiB and issues a write(2) per block
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+
+# Background download jobs. Their state lives in DOWNLOAD_FOLDER/<job_id>/job.json
+# so any gunicorn worker can answer a status poll, not only the one that
+# queued the job. Finished/failed jobs are deleted after JOB_TTL seconds and
+# jobs stuck in any state (e.g. their worker died) after JOB_MAX_AGE.
+EXECUTOR = ThreadPoolExecutor(max_workers=8)
+JOB_ID_RE = re.compile(r'[0-9a-f]{32}')
+JOB_TTL = int(os.environ.get('JOB_TTL', 3600))
+JOB_MAX_AGE = 24 * 3600
+
+# ffmpeg transcodes run in their own pool, so downloads never wait behind
+# an encoder. Every gunicorn worker has its own pool, so the number of
+# concurrent ffmpeg processes is capped host-wide by TRANSCODE_SLOTS flock'd
+# slot files shared by all workers
+TRANSCODE_SLOTS = max(1, (os.cpu_count() or 2) // 2)
+TRANSCODE_SLOT_DIR = os.path.join(DOWNLOAD_FOLDER, '.transcode-slots')
+os.makedirs(TRANSCODE_SLOT_DIR, exist_ok=True)
+TRANSCODE_EXECUTOR = ThreadPoolExecutor(max_workers=TRANSCODE_SLOTS)
 
 # Rotating user agents
 USER_AGENTS = [
@@ -28,9 +118,124 @@ USER_AGENTS = [
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0'
 ]
+_UA = tuple(USER_AGENTS)
+_UA_N = len(_UA)
+_UA_CTR = itertools.count()
 
-def get_ytdl_opts(include_pot=False):
-    """Generate dynamic yt-dlp options with current timestamp"""
+# DNS cache: yt-dlp resolves the same YouTube hosts many times per video,
+# so memoize getaddrinfo for a few minutes
+DNS_CACHE_TTL = 300
+DNS_CACHE_MAXSIZE = 256
+_DNS_CACHE = OrderedDict()
+_DNS_CACHE_LOCK = Lock()
+_real_getaddrinfo = socket.getaddrinfo
+
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    with _DNS_CACHE_LOCK:
+        entry = _DNS_CACHE.get(key)
+        if entry and entry[0] > now:
+            _DNS_CACHE.move_to_end(key)
+            return entry[1]
+    result = _real_getaddrinfo(host, port, *args, **kwargs)
+    with _DNS_CACHE_LOCK:
+        _DNS_CACHE[key] = (now + DNS_CACHE_TTL, result)
+        _DNS_CACHE.move_to_end(key)
+        while len(_DNS_CACHE) > DNS_CACHE_MAXSIZE:
+            _DNS_CACHE.popitem(last=False)
+    return result
+
+socket.getaddrinfo = _cached_getaddrinfo
+
+# Under gevent (the default gunicorn worker) socket.create_connection is
+# gevent's, which resolves through gevent.socket's own getaddrinfo global
+# rather than socket.getaddrinfo, so wrap that too
+_gevent_socket = sys.modules.get('gevent.socket')
+if _gevent_socket is not None and socket.create_connection is _gevent_socket.create_connection:
+    _gevent_socket.getaddrinfo = _cached_getaddrinfo
+
+def check_dns_cache():
+    """Raise if socket.create_connection (used by httpx and urllib) bypasses the DNS cache"""
+    port = 9  # discard; the connection itself is expected to fail
+    try:
+        socket.create_connection(('localhost', port), timeout=1).close()
+    except OSError:
+        pass
+    with _DNS_CACHE_LOCK:
+        used = any(key[:2] == ('localhost', port) for key in _DNS_CACHE)
+    if not used:
+        raise RuntimeError('socket.create_connection bypasses the getaddrinfo cache')
+
+# Process-wide pool of idle YoutubeDL instances, keyed by their options, so
+# HTTP keep-alive sockets survive between requests. YoutubeDL is not
+# thread-safe, so each instance is checked out by one call at a time. The
+# rotating User-Agent is left out of the key and applied on checkout, and at
+# most YDL_POOL_MAX_IDLE instances per key are kept; extras are closed
+YDL_POOL_MAX_IDLE = 4
+_YDL_POOL = {}
+_YDL_POOL_LOCK = Lock()
+
+def _retry_sleep(n):
+    """Exponential backoff for yt-dlp retries, capped at 10 seconds"""
+    return min(2 ** n, 10)
+
+def _freeze(obj):
+    """Turn nested option dicts/lists into a hashable pool key"""
+    if isinstance(obj, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+def _set_user_agent(ydl, user_agent):
+    """Point a pooled YoutubeDL and its request handlers at a new User-Agent"""
+    ydl.params['http_headers']['User-Agent'] = user_agent
+    # Handlers copy the headers once at construction, so update their copy too
+    for handler in ydl._request_director.handlers.values():
+        handler.headers['User-Agent'] = user_agent
+
+@contextmanager
+def _checkout_ydl(ydl_opts):
+    """Borrow an idle YoutubeDL for these options, creating one if none is free"""
+    headers = dict(ydl_opts.get('http_headers') or {})
+    user_agent = headers.pop('User-Agent', None)
+    key = _freeze({**ydl_opts, 'http_headers': headers})
+    with _YDL_POOL_LOCK:
+        idle = _YDL_POOL.setdefault(key, [])
+        ydl = idle.pop() if idle else None
+    if ydl is None:
+        # YoutubeDL fills defaults into the dict it is given; keep the caller's intact
+        ydl = yt_dlp.YoutubeDL(dict(ydl_opts))
+    elif user_agent:
+        _set_user_agent(ydl, user_agent)
+    try:
+        yield ydl
+    finally:
+        with _YDL_POOL_LOCK:
+            idle = _YDL_POOL[key]
+            if len(idle) < YDL_POOL_MAX_IDLE:
+                idle.append(ydl)
+                ydl = None
+        if ydl is not None:
+            try:
+                ydl.close()
+            except Exception as e:
+                logger.warning(f"Error closing YoutubeDL: {str(e)}")
+
+@atexit.register
+def _close_ydl_pool():
+    with _YDL_POOL_LOCK:
+        for idle in _YDL_POOL.values():
+            for ydl in idle:
+                try:
+                    ydl.close()
+                except Exception as e:
+                    logger.warning(f"Error closing YoutubeDL: {str(e)}")
+        _YDL_POOL.clear()
+
+def _build_base_opts(include_pot):
+    """Build the static part of the yt-dlp options (everything but the User-Agent)"""
     base_opts = {
         'quiet': True,
         'no_warnings': False,
@@ -38,7 +243,6 @@ def get_ytdl_opts(include_pot=False):
         'socket_timeout': 15,
         'extract_flat': False,
         'http_headers': {
-            'User-Agent': random.choice(USER_AGENTS),
             'Accept-Language': 'en-US,en;q=0.9',
             'Referer': 'https://www.youtube.com/',
             'Origin': 'https://www.youtube.com'
@@ -53,26 +257,102 @@ def get_ytdl_opts(include_pot=False):
         },
         'retries': 3,
         'retry_sleep_functions': {
-            'http': lambda n: min(2 ** n, 10),
-            'fragment': lambda n: min(2 ** n, 10),
+            'http': _retry_sleep,
+            'fragment': _retry_sleep,
         }
     }
-    
+
     # Add PO Token if available (read from environment variable)
     if os.environ.get('YT_PO_TOKEN'):
         base_opts['extractor_args']['youtube']['po_token'] = os.environ.get('YT_PO_TOKEN')
-    
+
     return base_opts
 
-@app.route('/info', methods=['GET'])
-def get_video_info():
-    url = request.args.get('url')
-    if not url:
-        logger.error("No URL provided")
-        return jsonify({'error': 'URL parameter is required'}), 400
+# Built once at import; nested dicts are shared and must not be mutated
+_BASE_OPTS_POT = _build_base_opts(include_pot=True)
+_BASE_OPTS_NOPOT = _build_base_opts(include_pot=False)
+
+def get_ytdl_opts(include_pot=False):
+    """Return yt-dlp options with a rotated User-Agent"""
+    opts = dict(_BASE_OPTS_POT if include_pot else _BASE_OPTS_NOPOT)
+    opts['http_headers'] = {**opts['http_headers'], 'User-Agent': _UA[next(_UA_CTR) % _UA_N]}
+    return opts
+
+VIDEO_PATH_PREFIXES = frozenset(('shorts', 'embed', 'live', 'v'))
+YOUTUBE_HOSTS = frozenset((
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtu.be', 'www.youtu.be'
+))
+
+def normalize_url(url):
+    """Strip tracking parameters and fragments from a URL.
+
+    Returns (clean_url, cache_key). For YouTube hosts the key is
+    'youtube:<video id>' and only the v= parameter survives, since watch
+    URLs need it. Other URLs keep their query (it may identify the page) and
+    are keyed by that cleaned form, so a foreign page can never be cached
+    under a YouTube video id.
+    """
+    parts = urlsplit(url)
+    if (parts.hostname or '') not in YOUTUBE_HOSTS:
+        clean_url = urlunsplit((parts.scheme, parts.netloc, parts.path, parts.query, ''))
+        return clean_url, clean_url
+
+    video_id = parse_qs(parts.query).get('v', [None])[0]
+    query = f'v={video_id}' if video_id else ''
+    clean_url = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+    if not video_id:
+        # youtu.be/<id>, /shorts/<id>, /embed/<id>, /live/<id>
+        segments = parts.path.strip('/').split('/')
+        if parts.hostname.endswith('youtu.be') or (len(segments) == 2 and segments[0] in VIDEO_PATH_PREFIXES):
+            video_id = segments[-1]
+    return clean_url, f'youtube:{video_id}' if video_id else clean_url
+
+def _encode_payload(data, compress=False):
+    """Serialize a response once so it can be served repeatedly as bytes"""
+    body = orjson.dumps(data)
+    gzipped = gzip.compress(body, compresslevel=1) if compress else None
+    return body, gzipped, msgpack.packb(data, use_bin_type=True)
+
+def _wants_msgpack():
+    return request.accept_mimetypes.best_match(
+        ['application/json', 'application/msgpack']) == 'application/msgpack'
+
+def _fetch_info(url, refresh=False):
+    """Extract simplified video info for a URL.
+
+    Returns ((json_bytes, gzip_bytes, msgpack_bytes), status); gzip_bytes is
+    None for errors.
+    """
+    try:
+        clean_url, cache_key = normalize_url(url)
+    except ValueError as e:
+        logger.error(f"Invalid URL {url!r}: {str(e)}")
+        return _encode_payload({'error': 'Invalid URL', 'details': str(e)}), 400
+
+    if not refresh:
+        with INFO_CACHE_LOCK:
+            cached = INFO_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for: {cache_key}")
+            return cached, 200
+
+        try:
+            body = META_CACHE.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Metadata cache read failed: {str(e)}")
+            body = None
+        if body is not None:
+            logger.info(f"Persistent cache hit for: {cache_key}")
+            payload = (
+                body,
+                gzip.compress(body, compresslevel=1),
+                msgpack.packb(orjson.loads(body), use_bin_type=True)
+            )
+            with INFO_CACHE_LOCK:
+                INFO_CACHE[cache_key] = payload
+            return payload, 200
 
-    # Clean URL parameters that might cause issues
-    clean_url = url.split('?')[0]
     logger.info(f"Processing info request for: {clean_url}")
 
     try:
@@ -80,80 +360,295 @@ def get_video_info():
         ydl_opts = get_ytdl_opts(include_pot=False)
         ydl_opts.update({'extract_flat': 'in_playlist'})
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with _checkout_ydl(ydl_opts) as ydl:
             info = ydl.extract_info(clean_url, download=False)
 
-            if not info:
-                logger.error(f"No info extracted for URL: {clean_url}")
-                return jsonify({'error': 'Could not extract video information'}), 404
+        if not info:
+            logger.error(f"No info extracted for URL: {clean_url}")
+            return _encode_payload({'error': 'Could not extract video information'}), 404
 
-            if info.get('_type') == 'playlist':
-                logger.warning(f"Playlist detected: {clean_url}")
-                return jsonify({'error': 'Playlists are not supported'}), 400
+        if info.get('_type') == 'playlist':
+            logger.warning(f"Playlist detected: {clean_url}")
+            return _encode_payload({'error': 'Playlists are not supported'}), 400
 
-            # Check if we got usable formats
+        # Check if we got usable formats
+        usable_formats = [f for f in info.get('formats', []) if f.get('url')]
+        
+        # If no usable formats, try with POT workaround
+        if not usable_formats:
+            logger.warning("No usable formats found, retrying with POT workaround")
+            ydl_opts = get_ytdl_opts(include_pot=True)
+            with _checkout_ydl(ydl_opts) as ydl_retry:
+                info = ydl_retry.extract_info(clean_url, download=False)
             usable_formats = [f for f in info.get('formats', []) if f.get('url')]
-            
-            # If no usable formats, try with POT workaround
-            if not usable_formats:
-                logger.warning("No usable formats found, retrying with POT workaround")
-                ydl_opts = get_ytdl_opts(include_pot=True)
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl_retry:
-                    info = ydl_retry.extract_info(clean_url, download=False)
-                    usable_formats = [f for f in info.get('formats', []) if f.get('url')]
-
-            response_data = {
-                'status': 'success',
-                'video_id': info.get('id'),
-                'title': info.get('title'),
-                'duration': info.get('duration'),
-                'thumbnail': info.get('thumbnail'),
-                'uploader': info.get('uploader'),
-                'view_count': info.get('view_count'),
-                'availability': info.get('availability'),
-                'formats': [],
-                'warnings': []
-            }
 
-            for fmt in usable_formats:
-                response_data['formats'].append({
-                    'format_id': fmt.get('format_id'),
-                    'ext': fmt.get('ext'),
-                    'resolution': fmt.get('resolution'),
-                    'filesize': fmt.get('filesize'),
-                    'protocol': fmt.get('protocol'),
-                    'vcodec': fmt.get('vcodec'),
-                    'acodec': fmt.get('acodec')
-                })
-
-            # Add warnings if we had to use workarounds
-            if len(usable_formats) < len(info.get('formats', [])):
-                response_data['warnings'].append(
-                    'Some formats unavailable due to YouTube restrictions'
-                )
-                if os.environ.get('YT_PO_TOKEN'):
-                    response_data['warnings'].append(
-                        'Consider updating your PO Token for more formats'
-                    )
-                else:
-                    response_data['warnings'].append(
-                        'Consider providing a PO Token for more formats'
-                    )
-
-            logger.info(f"Successfully retrieved info for: {clean_url}")
-            return jsonify(response_data)
+        response_data = simplify_info(info, usable_formats, bool(os.environ.get('YT_PO_TOKEN')))
+
+        payload = _encode_payload(response_data, compress=True)
+        with INFO_CACHE_LOCK:
+            INFO_CACHE[cache_key] = payload
+        try:
+            META_CACHE.put(cache_key, payload[0])
+        except Exception as e:
+            logger.warning(f"Metadata cache write failed: {str(e)}")
+
+        logger.info(f"Successfully retrieved info for: {clean_url}")
+        return payload, 200
 
     except yt_dlp.utils.DownloadError as e:
         logger.error(f"DownloadError: {str(e)}")
-        return jsonify({'error': 'YouTube download error', 'details': str(e)}), 502
+        return _encode_payload({'error': 'YouTube download error', 'details': str(e)}), 502
     except yt_dlp.utils.ExtractorError as e:
         logger.error(f"ExtractorError: {str(e)}")
-        return jsonify({'error': 'YouTube extraction error', 'details': str(e)}), 502
+        return _encode_payload({'error': 'YouTube extraction error', 'details': str(e)}), 502
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-        return jsonify({'error': 'Internal server error'}), 500
+        return _encode_payload({'error': 'Internal server error'}), 500
+
+@app.route('/info', methods=['GET'])
+def get_video_info():
+    url = request.args.get('url')
+    if not url:
+        logger.error("No URL provided")
+        return jsonify({'error': 'URL parameter is required'}), 400
+
+    (body, gzipped, packed), status = _fetch_info(url, refresh=request.args.get('refresh') == '1')
+    if _wants_msgpack():
+        response = app.response_class(packed, status=status, mimetype='application/msgpack')
+        response.vary.add('Accept')
+        return response
+
+    response = app.response_class(body, status=status, mimetype='application/json')
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if gzipped is not None and request.accept_encodings['gzip']:
+        response.set_data(gzipped)
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/info/batch', methods=['POST'])
+def get_video_info_batch():
+    payload = request.get_json(silent=True)
+    urls = payload.get('urls') if isinstance(payload, dict) else None
+    if not isinstance(urls, list) or not urls or not all(isinstance(u, str) for u in urls):
+        logger.error("No URLs provided for batch request")
+        return jsonify({'error': 'A non-empty "urls" list is required'}), 400
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({'error': f'At most {MAX_BATCH_URLS} URLs per batch'}), 400
+
+    logger.info(f"Processing batch info request for {len(urls)} URLs")
+    with ThreadPoolExecutor(max_workers=min(10, len(urls))) as pool:
+        payloads = list(pool.map(lambda u: _fetch_info(u)[0], urls))
+
+    # Splice the already-serialized payloads instead of re-encoding them
+    if _wants_msgpack():
+        packer = msgpack.Packer(use_bin_type=True)
+        body = (packer.pack_map_header(1) + packer.pack('results')
+                + packer.pack_array_header(len(payloads))
+                + b''.join(p[2] for p in payloads))
+        response = app.response_class(body, mimetype='application/msgpack')
+    else:
+        body = b'{"results":[' + b','.join(p[0] for p in payloads) + b']}'
+        response = app.response_class(body, mimetype='application/json')
+    response.vary.add('Accept')
+    return response
+
+def allowed_file(filename):
+    return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+
+def _job_dir(job_id):
+    """Each job downloads into its own directory so jobs never share files"""
+    return os.path.join(DOWNLOAD_FOLDER, job_id)
+
+def _write_job(job_id, **state):
+    """Atomically replace a job's state file"""
+    path = os.path.join(_job_dir(job_id), 'job.json')
+    with open(path + '.tmp', 'wb') as f:
+        f.write(orjson.dumps(state))
+    os.replace(path + '.tmp', path)
+
+def _read_job(job_id):
+    """Return a job's state, or None for unknown (or malformed) job ids"""
+    if not JOB_ID_RE.fullmatch(job_id):
+        return None
+    try:
+        with open(os.path.join(_job_dir(job_id), 'job.json'), 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+def _prune_jobs():
+    """Delete expired job directories and their files"""
+    now = time.time()
+    for name in os.listdir(DOWNLOAD_FOLDER):
+        if not JOB_ID_RE.fullmatch(name):
+            continue
+        try:
+            age = now - os.stat(os.path.join(_job_dir(name), 'job.json')).st_mtime
+        except FileNotFoundError:
+            continue
+        if age > JOB_MAX_AGE or (age > JOB_TTL and (_read_job(name) or {}).get('status') in ('finished', 'error')):
+            logger.info(f"Removing expired job {name}")
+            shutil.rmtree(_job_dir(name), ignore_errors=True)
+
+def _run_job_step(job_id, step, *args):
+    """Run one stage of a job and record its outcome in the job's state file.
+
+    A stage that hands the job on to another pool returns None.
+    """
+    try:
+        result = step(*args)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        _write_job(job_id, status='error', details=str(e))
+        return
+    if result is not None:
+        _write_job(job_id, status='finished', **result)
+
+@contextmanager
+def _transcode_slot():
+    """Hold one of the host-wide ffmpeg slots, waiting until one is free"""
+    while True:
+        for i in range(TRANSCODE_SLOTS):
+            fd = os.open(os.path.join(TRANSCODE_SLOT_DIR, str(i)), os.O_CREAT | os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                yield
+            finally:
+                # Closing the descriptor releases the lock
+                os.close(fd)
+            return
+        time.sleep(0.5)
+
+def _transcode_mp3(result, job_id):
+    """Re-encode a finished audio download to MP3 with ffmpeg"""
+    src = os.path.join(_job_dir(job_id), result['filename'])
+    dst = os.path.splitext(src)[0] + '.mp3'
+    try:
+        with _transcode_slot():
+            logger.info(f"Job {job_id}: transcoding {src}")
+            proc = subprocess.run(
+                ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-threads', '0',
+                 '-i', src, '-vn', '-c:a', 'libmp3lame', '-b:a', '192k', dst],
+                capture_output=True, text=True
+            )
+    finally:
+        os.remove(src)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.strip()}")
+
+    logger.info(f"Job {job_id}: finished {dst}")
+    return {**result, 'filename': os.path.basename(dst)}
+
+def _do_download(url, ydl_opts, job_id, transcode=False):
+    """Run a yt-dlp download in the background and describe the result"""
+    _write_job(job_id, status='running')
+    logger.info(f"Job {job_id}: downloading {url}")
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        filepath = info['requested_downloads'][0]['filepath']
+
+    if not allowed_file(filepath):
+        os.remove(filepath)
+        raise ValueError(f"Unsupported file type: {os.path.basename(filepath)}")
+
+    result = {
+        'title': info.get('title'),
+        'filename': os.path.basename(filepath)
+    }
+    if transcode:
+        # Hand off to the transcode pool and free this download worker
+        TRANSCODE_EXECUTOR.submit(_run_job_step, job_id, _transcode_mp3, result, job_id)
+        return None
+
+    logger.info(f"Job {job_id}: finished {filepath}")
+    return result
+
+@app.route('/download', methods=['POST'])
+def download_video():
+    url = request.args.get('url')
+    if not url:
+        logger.error("No URL provided")
+        return jsonify({'error': 'URL parameter is required'}), 400
+
+    format_id = request.args.get('format_id')
+    audio_only = request.args.get('audio_only') == '1'
+    job_id = uuid.uuid4().hex
+
+    ydl_opts = get_ytdl_opts(include_pot=False)
+    ydl_opts.update({
+        'outtmpl': os.path.join(_job_dir(job_id), '%(title)s-%(id)s.%(ext)s'),
+        'restrictfilenames': True,
+        'noplaylist': True,
+        'buffersize': DOWNLOAD_BUFFER_SIZE,
+        'noresizebuffer': True
+    })
+
+    # Audio is delivered as the native stream; transcode=mp3 opts into a
+    # re-encode on the transcode pool
+    transcode = audio_only and request.args.get('transcode') == 'mp3'
+    if audio_only:
+        ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio'
+    else:
+        ydl_opts['format'] = format_id or 'best'
+
+    _prune_jobs()
+    os.makedirs(_job_dir(job_id))
+    _write_job(job_id, status='queued')
+    EXECUTOR.submit(_run_job_step, job_id, _do_download, url, ydl_opts, job_id, transcode)
+    logger.info(f"Queued download job {job_id} for: {url}")
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+@app.route('/download/<job_id>', methods=['GET'])
+def get_download_status(job_id):
+    job = _read_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+
+    if job['status'] == 'error':
+        return jsonify({
+            'job_id': job_id,
+            'status': 'error',
+            'error': 'YouTube download error',
+            'details': job.get('details')
+        }), 502
+
+    if job['status'] != 'finished':
+        return jsonify({'job_id': job_id, 'status': job['status']})
+
+    return jsonify({
+        'job_id': job_id,
+        'file_url': url_for('get_download_file', job_id=job_id),
+        **job
+    })
+
+@app.route('/download/<job_id>/file', methods=['GET'])
+def get_download_file(job_id):
+    job = _read_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    if job['status'] != 'finished':
+        return jsonify({'error': 'Download is not available'}), 409
+
+    filename = job['filename']
+    filepath = os.path.join(_job_dir(job_id), filename)
+    if not os.path.isfile(filepath):
+        return jsonify({'error': 'File no longer exists'}), 410
+
+    if X_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the file itself with sendfile(2)
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['X-Accel-Redirect'] = f"{X_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{job_id}/{quote(filename)}"
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
-if __name__ == '__main__':
-    # Verify yt-dlp version
-    logger.info(f"Using yt-dlp version: {yt_dlp.version.__version__}")
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), threaded=True)
+    # Let the WSGI server stream the file (sendfile where supported)
+    return send_file(
+        os.path.abspath(filepath),
+        as_attachment=True,
+        download_name=filename,
+        conditional=True
+    )
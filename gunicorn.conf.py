@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+
+# Cooperative (gevent) workers by default: extract_info spends most of its
+# time blocked on sockets, so one event loop per worker can keep hundreds
+# of requests in flight. Set GUNICORN_WORKER_CLASS=gthread to fall back to
+# a fixed thread pool per worker.
+#
+# Behind nginx, set GUNICORN_BIND=unix:/run/ytapi.sock (see deploy/nginx.conf)
+# to skip the TCP stack entirely. All workers accept() on the one listening
+# socket the master creates; the deep backlog absorbs bursts while they are
+# busy.
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+backlog = 4096
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 500))
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+worker_tmp_dir = '/dev/shm'
+timeout = 120
+
+
+def post_worker_init(worker):
+    # Runs after the worker class (e.g. gevent's monkey-patching) is set up
+    # and the app is loaded; refuse to serve if DNS lookups skip the cache
+    from app import check_dns_cache
+    check_dns_cache()
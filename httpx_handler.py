@@ -0,0 +1,137 @@
+"""httpx-backed request handler for yt-dlp.
+
+Importing this module registers HttpxRH with yt-dlp and makes it the
+preferred handler for http(s) URLs. Unlike yt-dlp's urllib handler, which
+opens a fresh connection for every request, it keeps a pooled HTTP/2
+client per cookie jar so TLS handshakes to youtube.com and googlevideo.com
+are paid once per host. Requests that need a proxy fall back to urllib.
+"""
+import ssl
+
+import httpx
+from yt_dlp.networking.common import (
+    RequestHandler,
+    Response,
+    register_preference,
+    register_rh,
+)
+from yt_dlp.networking._helper import InstanceStoreMixin
+from yt_dlp.networking.exceptions import (
+    CertificateVerifyError,
+    HTTPError,
+    RequestError,
+    SSLError,
+    TransportError,
+)
+
+MAX_KEEPALIVE_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 60
+
+
+def _find_ssl_error(e):
+    """Return the ssl exception somewhere in e's cause/context chain, if any"""
+    seen = set()
+    while e is not None and id(e) not in seen:
+        if isinstance(e, ssl.SSLError):
+            return e
+        seen.add(id(e))
+        e = e.__cause__ or e.__context__
+    return None
+
+
+def _raise_transport_error(e):
+    """Translate an httpx exception into the matching yt-dlp error"""
+    # httpx wraps the httpcore exception, which in turn wraps the ssl one
+    cause = _find_ssl_error(e)
+    if isinstance(cause, ssl.SSLCertVerificationError):
+        raise CertificateVerifyError(cause=e) from e
+    if isinstance(cause, ssl.SSLError):
+        raise SSLError(cause=e) from e
+    raise TransportError(cause=e) from e
+
+
+class HttpxResponseAdapter(Response):
+    def __init__(self, res):
+        super().__init__(
+            fp=res, url=str(res.url), headers={},
+            status=res.status_code, reason=res.reason_phrase)
+        # Keep repeated headers (e.g. Set-Cookie) as separate entries
+        for name, value in res.headers.multi_items():
+            self.headers.add_header(name, value)
+        self._chunks = res.iter_bytes()
+        self._buffer = bytearray()
+
+    def readable(self):
+        return True
+
+    def read(self, amt=None):
+        try:
+            if amt is None:
+                self._buffer.extend(b''.join(self._chunks))
+                amt = len(self._buffer)
+            while len(self._buffer) < amt:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._buffer.extend(chunk)
+        except httpx.HTTPError as e:
+            _raise_transport_error(e)
+
+        data = bytes(self._buffer[:amt])
+        del self._buffer[:amt]
+        return data
+
+
+@register_rh
+class HttpxRH(RequestHandler, InstanceStoreMixin):
+    _SUPPORTED_URL_SCHEMES = ('http', 'https')
+    # No proxy support: proxied requests are left to the urllib handler
+    _SUPPORTED_PROXY_SCHEMES = ()
+    _SUPPORTED_FEATURES = ()
+    RH_NAME = 'httpx'
+
+    def _check_extensions(self, extensions):
+        super()._check_extensions(extensions)
+        extensions.pop('cookiejar', None)
+        extensions.pop('timeout', None)
+
+    def _create_instance(self, cookiejar):
+        transport = httpx.HTTPTransport(
+            verify=self._make_sslcontext(),
+            http2=True,
+            limits=httpx.Limits(
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY),
+            local_address=self.source_address,
+        )
+        return httpx.Client(transport=transport, cookies=cookiejar, follow_redirects=True)
+
+    def close(self):
+        self._clear_instances()
+
+    def _send(self, request):
+        client = self._get_instance(
+            cookiejar=request.extensions.get('cookiejar') or self.cookiejar)
+        try:
+            httpx_req = client.build_request(
+                request.method,
+                request.url,
+                content=request.data,
+                headers=dict(self._merge_headers(request.headers)),
+                timeout=float(request.extensions.get('timeout') or self.timeout),
+            )
+            res = client.send(httpx_req, stream=True)
+        except (httpx.InvalidURL, httpx.UnsupportedProtocol, httpx.TooManyRedirects) as e:
+            raise RequestError(cause=e) from e
+        except httpx.HTTPError as e:
+            _raise_transport_error(e)
+
+        response = HttpxResponseAdapter(res)
+        if res.status_code >= 400:
+            raise HTTPError(response)
+        return response
+
+
+@register_preference(HttpxRH)
+def httpx_preference(rh, request):
+    return 100
@@ -0,0 +1,54 @@
+"""Persistent video-metadata cache backed by sqlite.
+
+Serialized /info payloads are stored zstd-compressed, keyed by video id,
+so the cache survives restarts and deploys.
+"""
+import sqlite3
+import time
+from threading import Lock
+
+import zstandard as zstd
+
+
+class MetaCache:
+    def __init__(self, path, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._compressor = zstd.ZstdCompressor(level=3)
+        self._decompressor = zstd.ZstdDecompressor()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS info(vid TEXT PRIMARY KEY, ts INT, blob BLOB)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS info_ts ON info(ts)')
+        self._db.commit()
+
+    def get(self, vid):
+        """Return the cached JSON bytes for a video id, or None if missing/expired"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT blob FROM info WHERE vid=? AND ts>?',
+                (vid, int(time.time() - self.ttl))
+            ).fetchone()
+            if row is None:
+                return None
+            return self._decompressor.decompress(row[0])
+
+    def put(self, vid, body):
+        """Store JSON bytes for a video id, evicting expired and oldest rows"""
+        now = int(time.time())
+        with self._lock:
+            blob = self._compressor.compress(body)
+            self._db.execute('INSERT OR REPLACE INTO info VALUES (?, ?, ?)', (vid, now, blob))
+            self._db.execute('DELETE FROM info WHERE ts<=?', (now - self.ttl,))
+            self._db.execute(
+                'DELETE FROM info WHERE vid IN '
+                '(SELECT vid FROM info ORDER BY ts DESC LIMIT -1 OFFSET ?)',
+                (self.maxsize,)
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
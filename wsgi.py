@@ -0,0 +1,7 @@
+from app import app, logger
+import yt_dlp
+
+# Verify yt-dlp version
+logger.info(f"Using yt-dlp version: {yt_dlp.version.__version__}")
+
+application = app